@@ -1,191 +1,359 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import json
+import os
 import re
-import subprocess
+import shlex
 from pathlib import Path
 from rich.console import Console
 from rich.tree import Tree
 from rich import print as rprint
-from typing import List, Tuple
+from typing import Callable, Iterable, Iterator, List, Tuple
 import pandas as pd
 
-def run_command_for_files(file_paths: List[str | Path], command: str) -> List[Tuple[str, str, str]]:
+_LOC_RE = re.compile(r'^\s*(\d+):(\d+)\s+(\w+)\s+(.+)$')
+_SPLIT_RE = re.compile(r'\s{2,}')
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\x1b\[\d+m')
+_HAS_ISSUE_RE = re.compile(r'^\s*\d+:\d+\s', re.MULTILINE)
+# A filter pattern that is a plain literal (escaped punctuation allowed), optionally anchored at the end
+_LITERAL_PATTERN_RE = re.compile(r'((?:\\[^A-Za-z0-9]|[^.^$*+?{}\[\]|()\\])+)(\$?)')
+_UNESCAPE_RE = re.compile(r'\\(.)')
+
+# Vale reports its first alert near the top of the output, so only this much is scanned
+ISSUE_SCAN_LIMIT = 4096
+
+FILEPATH_PLACEHOLDER = "{filepath}"
+DEFAULT_BATCH_SIZE = 64
+VALE_COLUMNS = ['filename', 'line', 'col', 'error_type', 'error_msg', 'check_name']
+VALE_SEVERITIES = frozenset({'suggestion', 'warning', 'error'})
+# Severities and check names repeat heavily, so they are stored as categoricals
+VALE_DTYPES = {'line': 'int32', 'col': 'int32', 'error_type': 'category', 'check_name': 'category'}
+
+# One parsed issue, in VALE_COLUMNS order
+ValeRow = Tuple[str, int, int, str, str, str]
+
+def _with_json_output(argv: List[str]) -> List[str]:
+    """Ask Vale for JSON output unless the command already selects an output format."""
+    if not argv or Path(argv[0]).stem != 'vale':
+        return argv
+    if any(arg == '--output' or arg.startswith('--output=') for arg in argv[1:]):
+        return argv
+    return [argv[0], '--output=JSON'] + argv[1:]
+
+async def _run_one(file_paths: List[str], argv: List[str], env: dict[str, str],
+                   semaphore: asyncio.Semaphore) -> Tuple[List[str], str, str]:
+    """Run a single command invocation and return (filepaths, stdout, stderr)."""
+    async with semaphore:
+        try:
+            print(f"Running command: `{shlex.join(argv)}`")
+            # Run the command and capture output
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env
+            )
+            stdout, stderr = await process.communicate()
+            return (file_paths, stdout.decode(errors='replace').strip(), stderr.decode(errors='replace').strip())
+        except Exception as e:
+            # If there's any error, capture it in stderr
+            return (file_paths, "", str(e))
+
+async def _run_all(invocations: List[Tuple[List[str], List[str]]], env: dict[str, str],
+                   jobs: int) -> List[Tuple[List[str], str, str]]:
+    """Run all invocations from one event loop, with at most `jobs` in flight at once."""
+    semaphore = asyncio.Semaphore(jobs)
+    return await asyncio.gather(*(_run_one(chunk, argv, env, semaphore) for chunk, argv in invocations))
+
+def run_command_for_files(file_paths: List[str | Path], command: str, jobs: int | None = None,
+                          batch_size: int = DEFAULT_BATCH_SIZE) -> List[Tuple[List[str], str, str]]:
     """
-    Run a shell command for each file in the input list and capture stdout and stderr.
+    Run a command for the files in the input list and capture stdout and stderr.
+    
+    Files are passed to the command in batches of up to `batch_size` paths per invocation,
+    unless the command contains a {filepath} placeholder, in which case it is run once per
+    file with the placeholder substituted. Vale is asked for JSON output (--output=JSON)
+    unless the command already sets --output, and commands run with NO_COLOR set so text
+    output comes back without ANSI codes. Invocations run concurrently as asyncio
+    subprocesses driven from a single thread; results keep the order of the input list.
     
     Args:
         file_paths: List of file paths to process
-        command: Shell command to run. Use {filepath} as placeholder for the file path
+        command: Command to run, split with shell-like syntax. Use {filepath} as placeholder for the file path
+        jobs: Maximum number of commands to run at once (defaults to the CPU count)
+        batch_size: Maximum number of files passed to a single invocation
         
     Returns:
-        List of tuples containing (filepath, stdout, stderr) for each file
+        List of tuples containing (filepaths, stdout, stderr) for each invocation
     """
-    results = []
+    base_argv = _with_json_output(shlex.split(command))
+    paths = [str(fp) for fp in file_paths]  # Convert Path to string if needed
     
-    for file_path in file_paths:
-        file_path = str(file_path)  # Convert Path to string if needed
-        try:
-            file_path = re.sub(r'[()]', lambda m: f'\\{m.group(0)}', file_path)
-            # Replace the placeholder with actu
-            formatted_command = f"{command} {file_path}"
-            print(f"Running command: `{formatted_command}`")
-            # Run the command and capture output
-            process = subprocess.Popen(
-                formatted_command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True  # Return strings instead of bytes
-            )
-            
-            # Get stdout and stderr
-            stdout, stderr = process.communicate()
-            
-            # Add results to list
-            results.append((file_path, stdout.strip(), stderr.strip()))
-            
-        except Exception as e:
-            # If there's any error, capture it in stderr
-            results.append((file_path, "", str(e)))
+    if any(FILEPATH_PLACEHOLDER in arg for arg in base_argv):
+        invocations = [([fp], [arg.replace(FILEPATH_PLACEHOLDER, fp) for arg in base_argv]) for fp in paths]
+    else:
+        chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        invocations = [(chunk, base_argv + chunk) for chunk in chunks]
     
-    return results
+    # Ask for plain, uncoloured output
+    env = {**os.environ, 'NO_COLOR': '1', 'TERM': 'dumb'}
+    return asyncio.run(_run_all(invocations, env, jobs or os.cpu_count() or 1))
 
-def collect_files(directory: Path, pattern: str | None = None) -> list[Path]:
-    """Recursively collect all files in the given directory that match the pattern."""
+def _walk(directory: str) -> Iterator[os.DirEntry]:
+    """Recursively yield the file entries under directory without following directory symlinks."""
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                # DirEntry reuses the file type read with the directory listing, so no extra stat
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path)
+                elif entry.is_file():
+                    yield entry
+    except OSError:
+        # Skip directories we can't read, as rglob does
+        return
+
+def _name_matcher(pattern: str | re.Pattern | None) -> Callable[[str], bool] | None:
+    """
+    Build a file name filter for the pattern.
+    
+    Literal patterns such as '\\.md$' or 'README' are checked with str.endswith or `in`
+    instead of the regex engine; anything else uses the compiled regex's search.
+    """
+    if pattern is None:
+        return None
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    
+    literal_match = _LITERAL_PATTERN_RE.fullmatch(pattern.pattern)
+    if literal_match and pattern.flags == re.UNICODE:
+        literal = _UNESCAPE_RE.sub(r'\1', literal_match.group(1))
+        if literal_match.group(2):
+            return lambda name: name.endswith(literal)
+        return lambda name: literal in name
+    
+    return lambda name: pattern.search(name) is not None
+
+def collect_files(directory: Path, pattern: str | re.Pattern | None = None) -> Tuple[list[Path], int]:
+    """
+    Recursively collect all files in the given directory that match the pattern.
+    
+    Returns:
+        Tuple of (matching files, total number of files seen), from a single walk
+    """
+    matches = _name_matcher(pattern)
     files = []
-    for item in directory.rglob("*"):
-        if item.is_file():
-            # If pattern is provided, check if file matches the pattern
-            if pattern is None or re.search(pattern, str(item.name)):
-                files.append(item)
-    return files
-
-def create_file_tree(directory: Path, pattern: str | None = None) -> Tree:
-    """Create a rich Tree representation of the files."""
+    total = 0
+    for entry in _walk(str(directory)):
+        total += 1
+        # If pattern is provided, check if file matches the pattern
+        if matches is None or matches(entry.name):
+            files.append(Path(entry.path))
+    return files, total
+
+def create_file_tree(directory: Path, files: List[Path], pattern: str | re.Pattern | None = None) -> Tree:
+    """Create a rich Tree representation of the already collected files."""
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
     abs_dir = directory.absolute()
     tree = Tree(f"📁 [bold blue]{abs_dir}[/]")
     if pattern:
-        tree.label += f" [yellow](Filter: {pattern})[/]"
+        tree.label += f" [yellow](Filter: {pattern.pattern})[/]"
     
-    files = collect_files(directory, pattern)
+    # Resolve the working directory and the directory prefix once rather than per file
+    cwd = os.getcwd()
+    abs_dir_prefix = os.path.join(str(abs_dir), '')
     
-    for file in sorted(files):
-        abs_file = file.absolute()
+    for file in sorted(files, key=os.fspath):
+        abs_file = str(file) if file.is_absolute() else os.path.join(cwd, file)
         # Get relative path for better display
-        rel_path = abs_file.relative_to(abs_dir)
+        if abs_file.startswith(abs_dir_prefix):
+            rel_path = abs_file[len(abs_dir_prefix):]
+        else:
+            rel_path = Path(abs_file).relative_to(abs_dir)
         tree.add(f"📄 [green]{rel_path}[/] ([dim]{abs_file}[/])")
     
     return tree
 
 def strip_ansi_codes(text: str) -> str:
     """Remove ANSI escape codes from text."""
-    ansi_pattern = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\x1b\[\d+m')
-    return ansi_pattern.sub('', text)
+    return _ANSI_RE.sub('', text)
 
-def parse_vale_output(stdout: str, filename: str = None) -> pd.DataFrame:
+def _parse_vale_json(stdout: str) -> List[ValeRow]:
+    """Parse Vale's --output=JSON output, a mapping of file path to a list of alerts."""
+    data = json.loads(stdout)
+    return [
+        (fn, alert['Line'], alert['Span'][0], alert['Severity'], alert['Message'], alert['Check'])
+        for fn, alerts in data.items()
+        for alert in alerts
+    ]
+
+def _is_line_format(line: str) -> bool:
+    """Check whether a line has the `path:line:col:...` shape of Vale's --output=line."""
+    parts = line.split(':', 4)
+    return len(parts) == 5 and parts[1].isdigit() and parts[2].isdigit()
+
+def _parse_vale_line_format(lines: Iterable[str]) -> Iterator[ValeRow]:
     """
-    Parse Vale linter output and convert to a DataFrame.
+    Parse Vale's --output=line output with plain string splits.
+    
+    Vale's built-in format is `path:line:col:check:message`, which has no severity, so
+    error_type is left empty. Templates that add the severity after the column
+    (`path:line:col:severity:check:message`) are recognised from the severity name.
+    """
+    for line in lines:
+        parts = line.rstrip('\n').split(':', 5)
+        if len(parts) < 5 or not (parts[1].isdigit() and parts[2].isdigit()):
+            continue
+        if len(parts) == 6 and parts[3] in VALE_SEVERITIES:
+            path, line_num, col_num, error_type, check_name, msg = parts
+        else:
+            path, line_num, col_num, check_name = parts[:4]
+            msg = ':'.join(parts[4:])
+            error_type = ''
+        yield (path, int(line_num), int(col_num), error_type, msg.strip(), check_name)
+
+def has_vale_issues(stdout: str) -> bool:
+    """Cheaply check whether Vale output reports any issues, without parsing it."""
+    head = stdout[:ISSUE_SCAN_LIMIT].strip()
+    if head.startswith('{'):
+        # Vale prints an empty JSON object when there is nothing to report
+        return head != '{}'
+    if _is_line_format(head.partition('\n')[0]):
+        return True
+    return _HAS_ISSUE_RE.search(head) is not None
+
+def parse_vale_lines(lines: Iterable[str], filename: str = None) -> Iterator[ValeRow]:
+    """
+    Parse Vale's default text output line by line, yielding one row per issue.
+    
+    Lines are consumed lazily, so any line iterator works, including a file object or a
+    subprocess pipe. ANSI codes are not stripped here; run Vale with NO_COLOR set or strip
+    them beforehand.
     
     Args:
-        stdout: String output from Vale command
-        filename: Optional filename being processed
+        lines: Lines of Vale output, with or without trailing newlines
+        filename: Optional filename being processed. If not given, it is taken from the
+            file header lines in the output, so output covering several files is attributed
+            to each of them.
         
-    Returns:
-        DataFrame with columns: filename, line, col, error_type, error_msg, check_name
+    Yields:
+        (filename, line, col, error_type, error_msg, check_name) tuples
     """
-    # Initialize lists to store the parsed data
-    filenames = []
-    line_nums = []
-    col_nums = []
-    error_types = []
-    error_msgs = []
-    check_names = []
-    
-    # Split the output into lines and strip ANSI codes
-    lines = [strip_ansi_codes(line) for line in stdout.strip().split('\n')]
-    
-    # Get filename from first line if not provided
-    if not filename and lines and lines[0].strip().endswith(('.mdx', '.md')):
-        filename = lines[0].strip()
-    
-    # Skip only the first line if it's just the filename
-    start_idx = 1 if len(lines) > 1 and (lines[0].endswith('.mdx') or lines[0].endswith('.md')) else 0
-    
-    i = start_idx
-    while i < len(lines):
-        line = lines[i].strip()
+    # File headers are the first line of the output or follow a blank line
+    use_headers = not filename
+    at_header = True
+    
+    # The issue being collected; message continuation lines are appended until the next alert
+    current = None
+    
+    for line in lines:
+        line = line.strip()
         
-        # Skip empty lines and summary lines
+        # Empty lines and summary lines end the current issue
         if not line or line.startswith('✖'):
-            i += 1
+            if current:
+                yield tuple(current)
+                current = None
+            at_header = True
             continue
         
-        try:
-            # First try to match the line:col, type and rule
-            location_pattern = r'^\s*(\d+):(\d+)\s+(\w+)\s+(.+)$'
-            location_match = re.match(location_pattern, line)
+        # Match the line:col, type and rule once per line
+        location_match = _LOC_RE.match(line)
+        
+        if location_match:
+            if current:
+                yield tuple(current)
+                current = None
+            at_header = False
             
-            if location_match:
-                line_num, col_num, error_type, rest = location_match.groups()
-                
-                # Then split the rest to get message and check_name
-                # Split on two or more spaces to handle varying amounts of spacing
-                parts = re.split(r'\s{2,}', rest)
-                
-                if len(parts) >= 2:  # Changed condition to handle cases with multiple spaces
-                    msg = ' '.join(parts[:-1])  # Join all parts except the last one
-                    check_name = parts[-1]  # Last part is the check name
-                    
-                    # Initialize full message
-                    full_msg = msg.strip()
-                    
-                    # Look ahead at next lines to get the full message
-                    next_idx = i + 1
-                    while (next_idx < len(lines) and 
-                           lines[next_idx].strip() and 
-                           not re.match(r'^\d+:\d+', lines[next_idx]) and
-                           not lines[next_idx].startswith('✖')):
-                        additional_text = re.sub(r'^\s+', '', lines[next_idx].strip())
-                        if additional_text:
-                            full_msg += ' ' + additional_text
-                        next_idx += 1
-                    
-                    # Add to our lists
-                    filenames.append(filename)
-                    line_nums.append(int(line_num))
-                    col_nums.append(int(col_num))
-                    error_types.append(error_type)
-                    error_msgs.append(full_msg.strip())
-                    check_names.append(check_name.strip())
-                    
-                    # Move to the next error
-                    i = next_idx
-                    continue
+            line_num, col_num, error_type, rest = location_match.groups()
             
-        except Exception as e:
-            # If there's an error parsing, skip this line
-            pass
+            # Then split the rest to get message and check_name
+            # Split on two or more spaces to handle varying amounts of spacing
+            parts = _SPLIT_RE.split(rest)
+            
+            if len(parts) >= 2:  # Changed condition to handle cases with multiple spaces
+                msg = ' '.join(parts[:-1])  # Join all parts except the last one
+                check_name = parts[-1]  # Last part is the check name
+                current = [filename, int(line_num), int(col_num), error_type, msg.strip(), check_name.strip()]
+        elif current:
+            # Continuation of the current message
+            current[4] += ' ' + line
+        elif at_header:
+            # Take the filename from the header line if not provided
+            at_header = False
+            if use_headers:
+                filename = line
+    
+    if current:
+        yield tuple(current)
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """Lazily yield the lines of text, slicing one line at a time instead of splitting it into a list."""
+    start = 0
+    end = text.find('\n')
+    while end != -1:
+        yield text[start:end]
+        start = end + 1
+        end = text.find('\n', start)
+    if start < len(text):
+        yield text[start:]
+
+def parse_vale_output(stdout: str, filename: str = None) -> Iterable[ValeRow]:
+    """
+    Parse Vale linter output into rows for the results DataFrame.
+    
+    JSON output (--output=JSON) is decoded directly and carries its own filenames. The format
+    of any other output is detected from its first non-empty line: --output=line output takes
+    a split-based fast path, and everything else is parsed lazily as Vale's default text
+    format with parse_vale_lines.
+    
+    Args:
+        stdout: String output from Vale command
+        filename: Optional filename being processed, used for text output
         
-        i += 1
+    Returns:
+        Iterable of (filename, line, col, error_type, error_msg, check_name) tuples
+    """
+    if stdout[:ISSUE_SCAN_LIMIT].lstrip().startswith('{'):
+        try:
+            return _parse_vale_json(stdout)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            # Not Vale JSON after all, fall back to the text parser
+            pass
     
-    # Create DataFrame
-    df = pd.DataFrame({
-        'filename': filenames,
-        'line': line_nums,
-        'col': col_nums,
-        'error_type': error_types,
-        'error_msg': error_msgs,
-        'check_name': check_names
-    })
+    # Colour is normally disabled, but strip any ANSI codes in one pass over the whole output
+    if '\x1b' in stdout:
+        stdout = strip_ansi_codes(stdout)
     
-    return df
+    # Only the lines up to the first non-empty one are scanned to detect the format
+    first_line = next((line for line in _iter_lines(stdout) if line.strip()), '')
+    
+    if _is_line_format(first_line.strip()):
+        return _parse_vale_line_format(_iter_lines(stdout))
+    return parse_vale_lines(_iter_lines(stdout), filename)
+
+def _positive_int(value: str) -> int:
+    """argparse type for options that need an integer of at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
 
 def main():
     parser = argparse.ArgumentParser(description="List all files in a directory recursively and optionally run a command on them")
     parser.add_argument("directory", type=str, help="Directory to traverse")
     parser.add_argument("-p", "--pattern", type=str, help="Regex pattern to filter files (e.g. '\\.py$' for Python files)")
-    parser.add_argument("-c", "--command", type=str, help="Command to run on each file. Use {filepath} as placeholder for the file path")
+    parser.add_argument("-c", "--command", type=str, help="Command to run on the matched files. Use {filepath} as placeholder for the file path to run it once per file; otherwise files are appended in batches. Vale is run with --output=JSON unless --output is given")
+    parser.add_argument("-j", "--jobs", type=_positive_int, help="Maximum number of commands to run in parallel (defaults to the CPU count)")
+    parser.add_argument("-b", "--batch-size", type=_positive_int, default=DEFAULT_BATCH_SIZE, help=f"Maximum number of files passed to a single command invocation (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("-t", "--tree", action="store_true", help="Print a tree of the matched files before the summary")
     args = parser.parse_args()
     
     directory = Path(args.directory)
@@ -193,46 +361,51 @@ def main():
         rprint(f"[red]Error: {directory} is not a valid directory[/]")
         return
     
-    # Collect and display files
-    console = Console()
-    tree = create_file_tree(directory, args.pattern)
-    console.print(tree)
+    pattern = re.compile(args.pattern) if args.pattern else None
+    
+    # Walk the directory once, counting all files as the matches are collected
+    files, total_files = collect_files(directory, pattern)
+    
+    # Display files; the tree lists every match, so it is only drawn on request
+    if args.tree:
+        console = Console()
+        tree = create_file_tree(directory, files, pattern)
+        console.print(tree)
     
-    files = collect_files(directory, args.pattern)
     matched_files = len(files)
-    total_files = len(list(directory.rglob("*")))
     rprint(f"\n[bold cyan]Files matching pattern: {matched_files} (out of {total_files} total files)[/]")
     
     # If command is provided, run it on all matched files
     if args.command:
         rprint(f"\n[bold yellow]Running command: {args.command}[/]")
-        results = run_command_for_files(files, args.command)
+        results = run_command_for_files(files, args.command, args.jobs, args.batch_size)
         
-        # Collect all DataFrames
-        all_dfs = []
+        # Collect the parsed rows from every invocation
+        all_rows = []
         
         # Print results
-        for filepath, stdout, stderr in results:
-            rprint(f"\n[bold green]File: {filepath}[/]")
+        for filepaths, stdout, stderr in results:
+            label = "File" if len(filepaths) == 1 else "Files"
+            rprint(f"\n[bold green]{label}: {', '.join(filepaths)}[/]")
             if stdout:
                 print(stdout)
                 # Parse the output into a DataFrame if it's not empty
-                if 'warning' in stdout or 'error' in stdout:  # Basic check for Vale output
-                    df = parse_vale_output(stdout, str(filepath))
-                    if not df.empty:
-                        all_dfs.append(df)
+                if has_vale_issues(stdout):
+                    # Batched output names each file in its header lines
+                    all_rows.extend(parse_vale_output(stdout, filepaths[0] if len(filepaths) == 1 else None))
             if stderr:
                 rprint(f"[red]Error:[/]\n{stderr}")
         
-        # Concatenate all DataFrames if we have any
-        if all_dfs:
-            final_df = pd.concat(all_dfs, ignore_index=True)
+        # Build a single DataFrame if we found any issues
+        if all_rows:
+            final_df = pd.DataFrame.from_records(all_rows, columns=VALE_COLUMNS).astype(VALE_DTYPES)
             rprint("\n[bold cyan]All Parsed Results:[/]")
             print(final_df.to_string(index=False))
             
-            # Create error report DataFrame
-            error_report = final_df.groupby(['error_type', 'check_name']).size().reset_index(name='count')
-            error_report = error_report.sort_values('count', ascending=False)
+            # Create error report DataFrame, already sorted by descending count
+            counts = final_df.value_counts(['error_type', 'check_name'])
+            # Categorical columns also report combinations that never occur
+            error_report = counts[counts > 0].reset_index(name='count')
             
             rprint("\n[bold cyan]Error Report Summary:[/]")
             print(error_report.to_string(index=False))